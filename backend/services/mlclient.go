@@ -2,6 +2,7 @@ package services
 
 import (
 	"bytes"
+	"encoding/base64"
 	"encoding/json"
 	"fmt"
 	"io"
@@ -65,13 +66,34 @@ func (c *MLClient) EncodeImages(paths []string) ([][]float64, error) {
 		return nil, fmt.Errorf("encode images returned %d: %s", resp.StatusCode, respBody)
 	}
 
+	// The sidecar returns the (N, D) embedding matrix as base64 float16 bytes
 	var result struct {
-		Embeddings [][]float64 `json:"embeddings"`
+		EmbeddingsB64 string `json:"embeddings_b64"`
+		Shape         []int  `json:"shape"`
+		Dtype         string `json:"dtype"`
 	}
 	if err := json.NewDecoder(resp.Body).Decode(&result); err != nil {
 		return nil, fmt.Errorf("decoding encode images response: %w", err)
 	}
-	return result.Embeddings, nil
+	if result.Dtype != "float16" || len(result.Shape) != 2 {
+		return nil, fmt.Errorf("unexpected encode images response: dtype %q, shape %v",
+			result.Dtype, result.Shape)
+	}
+	raw, err := base64.StdEncoding.DecodeString(result.EmbeddingsB64)
+	if err != nil {
+		return nil, fmt.Errorf("decoding encode images embeddings: %w", err)
+	}
+	n, dim := result.Shape[0], result.Shape[1]
+	if len(raw) != n*dim*2 {
+		return nil, fmt.Errorf("encode images returned %d bytes for shape %v",
+			len(raw), result.Shape)
+	}
+
+	embeddings := make([][]float64, n)
+	for i := range embeddings {
+		embeddings[i] = HalfBytesToFloat64s(raw[i*dim*2 : (i+1)*dim*2])
+	}
+	return embeddings, nil
 }
 
 func (c *MLClient) EncodeText(text string) ([]float64, error) {
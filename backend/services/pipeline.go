@@ -117,7 +117,7 @@ func (p *Pipeline) IndexFrames(framesDir string, progress chan<- ProgressEvent)
 		// 5. Store embeddings
 		for j, f := range batch {
 			id := frameID(f)
-			embBytes := Float64sToBytes(embeddings[j])
+			embBytes := Float64sToHalfBytes(embeddings[j])
 			ts := f.Timestamp.Format(time.RFC3339)
 
 			if err := p.storage.AddClipEmbedding(id, embBytes,
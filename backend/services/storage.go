@@ -135,12 +135,85 @@ func (s *Storage) Close() error {
 	return s.db.Close()
 }
 
-// Float64sToBytes converts a slice of float64 values (from JSON) to raw
-// little-endian float32 bytes, matching Python's np.frombuffer(blob, dtype=np.float32).
-func Float64sToBytes(vals []float64) []byte {
-	buf := make([]byte, len(vals)*4)
+// Float64sToHalfBytes converts a slice of float64 values (from JSON) to raw
+// little-endian IEEE float16 bytes, matching Python's np.frombuffer(blob, dtype=np.float16).
+// CLIP embeddings are stored this way: half the bytes of float32 at no
+// measurable cost to cosine ranking.
+func Float64sToHalfBytes(vals []float64) []byte {
+	buf := make([]byte, len(vals)*2)
 	for i, v := range vals {
-		binary.LittleEndian.PutUint32(buf[i*4:], math.Float32bits(float32(v)))
+		binary.LittleEndian.PutUint16(buf[i*2:], float32ToHalf(float32(v)))
 	}
 	return buf
 }
+
+// HalfBytesToFloat64s decodes raw little-endian IEEE float16 bytes, as sent by
+// the ML sidecar's /encode/image, into float64 values.
+func HalfBytesToFloat64s(buf []byte) []float64 {
+	vals := make([]float64, len(buf)/2)
+	for i := range vals {
+		vals[i] = float64(halfToFloat32(binary.LittleEndian.Uint16(buf[i*2:])))
+	}
+	return vals
+}
+
+// halfToFloat32 widens an IEEE 754 binary16 value to float32 exactly.
+func halfToFloat32(h uint16) float32 {
+	sign := uint32(h&0x8000) << 16
+	exp := uint32(h>>10) & 0x1f
+	mant := uint32(h & 0x3ff)
+
+	switch {
+	case exp == 0x1f: // infinity or NaN
+		return math.Float32frombits(sign | 0x7f800000 | mant<<13)
+	case exp == 0:
+		if mant == 0 {
+			return math.Float32frombits(sign)
+		}
+		// Subnormal half: normalize into a float32 exponent
+		e := uint32(127 - 15 + 1)
+		for mant&0x400 == 0 {
+			mant <<= 1
+			e--
+		}
+		return math.Float32frombits(sign | e<<23 | (mant&0x3ff)<<13)
+	}
+	return math.Float32frombits(sign | (exp+127-15)<<23 | mant<<13)
+}
+
+// float32ToHalf rounds a float32 to the nearest IEEE 754 binary16 value
+// (ties to even), handling subnormals, overflow to infinity and NaN.
+func float32ToHalf(f float32) uint16 {
+	b := math.Float32bits(f)
+	sign := uint16(b>>16) & 0x8000
+	exp := int32(b>>23&0xff) - 127 + 15
+	mant := b & 0x7fffff
+
+	switch {
+	case b&0x7fffffff > 0x7f800000: // NaN
+		return sign | 0x7e00
+	case exp >= 0x1f: // too large for half, or infinity
+		return sign | 0x7c00
+	case exp <= 0: // subnormal half, or underflow to zero
+		if exp < -10 {
+			return sign
+		}
+		mant |= 0x800000
+		shift := uint32(14 - exp)
+		half := mant >> shift
+		rem := mant & (1<<shift - 1)
+		halfway := uint32(1) << (shift - 1)
+		if rem > halfway || (rem == halfway && half&1 == 1) {
+			half++
+		}
+		return sign | uint16(half)
+	}
+
+	// A rounding carry out of the mantissa correctly bumps the exponent.
+	half := uint32(exp)<<10 | mant>>13
+	rem := mant & 0x1fff
+	if rem > 0x1000 || (rem == 0x1000 && half&1 == 1) {
+		half++
+	}
+	return sign | uint16(half)
+}
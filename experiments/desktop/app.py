@@ -2,10 +2,14 @@
 """Desktop GUI app: rank images by similarity to a text query using MobileCLIP2,
 plus face-based search using the face_recognition library."""
 
+import io
 import json
 import os
+import sqlite3
 import threading
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from tkinter import filedialog, messagebox, simpledialog, ttk
 from pathlib import Path
 
@@ -13,18 +17,491 @@ import numpy as np
 import torch
 import open_clip
 from PIL import Image, ImageTk
+from torch.utils.data import DataLoader, Dataset
 from mobileclip.modules.common.mobileone import reparameterize_model
 
+try:
+    import simsimd
+except ImportError:  # optional: ranking falls back to a NumPy matmul
+    simsimd = None
+
+try:
+    from numba import njit, prange
+except ImportError:  # optional: face distances fall back to NumPy
+    njit = None
+
 IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tiff"}
 STANDARD_NORM_SUFFIXES = ("S3", "S4", "L-14")
 THUMBNAIL_SIZE = (150, 150)
 BATCH_SIZE = 32
+LOADER_WORKERS = max(1, (os.cpu_count() or 2) // 2)
 MODEL_NAME = "MobileCLIP2-S0"
 DEFAULT_THRESHOLD_PCT = 50
+MAX_RESULTS = 500
 DEFAULT_FACE_DISTANCE = 0.6
+FACE_INDEX_SAVE_EVERY = 50
+FACE_BATCH_SIZE = 32
+FACE_DETECT_MAX_SIDE = 640
 CONFIG_PATH = Path(__file__).resolve().parent / ".app_config.json"
-FACE_REGISTRY_PATH = Path(__file__).resolve().parent / ".face_registry.json"
-FACE_CACHE_PATH = Path(__file__).resolve().parent / ".face_cache.json"
+FACE_REGISTRY_PATH = Path(__file__).resolve().parent / ".face_registry.db"
+LEGACY_FACE_REGISTRY_PATH = Path(__file__).resolve().parent / ".face_registry.json"
+FACE_CACHE_PATH = Path(__file__).resolve().parent / ".face_cache.npy"
+FACE_CACHE_INDEX_PATH = Path(__file__).resolve().parent / ".face_cache_index.json"
+CLIP_CACHE_PATH = Path(__file__).resolve().parent / ".clip_cache.npy"
+CLIP_CACHE_INDEX_PATH = Path(__file__).resolve().parent / ".clip_cache_index.json"
+THUMB_CACHE_PATH = Path(__file__).resolve().parent / ".thumb_cache.npy"
+THUMB_CACHE_INDEX_PATH = Path(__file__).resolve().parent / ".thumb_cache_index.json"
+FACE_ENCODING_DIM = 128
+
+
+def collect_images(image_dir: Path) -> list[Path]:
+    """List image files in ``image_dir``, sorted.
+
+    ``os.scandir`` entries carry the file type from the directory listing,
+    so unlike ``Path.iterdir`` + ``is_file`` this needs no stat per entry.
+    """
+    with os.scandir(image_dir) as entries:
+        return sorted(
+            Path(entry.path) for entry in entries
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS
+        )
+
+
+def preprocess_size(preprocess) -> int | None:
+    """Return the side length the preprocess pipeline first resizes images to."""
+    size = getattr(preprocess.transforms[0], "size", None)
+    if isinstance(size, (tuple, list)):
+        return max(size)
+    return size
+
+
+def open_downscaled(path: Path, side: int | None) -> Image.Image:
+    """Open an image as RGB, its short edge shrunk in uint8 to at most 2x ``side``.
+
+    ``draft`` lets libjpeg decode straight to a reduced DCT scale, so large
+    photos never materialize at full resolution before preprocessing.
+    """
+    img = Image.open(path)
+    if side is None:
+        return img.convert("RGB")
+    img.draft("RGB", (side, side))
+    img = img.convert("RGB")
+    scale = 2 * side / min(img.size)
+    if scale < 1:
+        img = img.resize(
+            (round(img.width * scale), round(img.height * scale)), Image.BILINEAR
+        )
+    return img
+
+
+class EmbeddingCache:
+    """Embeddings in an ``.npy`` matrix plus a JSON index of path -> [row, mtime, count].
+
+    The matrix is memory-mapped on load, so opening a large cache is nearly
+    free. Each path owns ``count`` consecutive rows starting at ``row``, which
+    lets an image map to several embeddings (one per face) or to none.
+    New rows are buffered in memory until ``save``, which appends them to a
+    raw ``.tail`` file and their index entries to a ``.log`` of JSON lines, so
+    a save costs only what it adds. The base files are rewritten (compacted)
+    only when a path is re-encoded, or once the tail outgrows the base.
+    All methods are safe to call from several threads.
+    """
+
+    def __init__(self, matrix_path: Path, index_path: Path, tag: str,
+                 dim: int | None = None, dtype=np.float16):
+        self.matrix_path = matrix_path
+        self.index_path = index_path
+        self.tail_path = matrix_path.with_name(matrix_path.name + ".tail")
+        self.log_path = index_path.with_name(index_path.name + ".log")
+        self.tag = tag
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self._matrix = None
+        self._base_rows = 0
+        self._tail = None
+        self._tail_rows = 0
+        self._needs_compaction = False
+        self._index: dict[str, list] = {}
+        self._pending: dict[str, tuple[float, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            meta = json.loads(self.index_path.read_text())
+            # Embeddings from a different model are not comparable
+            if meta.get("tag") != self.tag:
+                return
+            matrix = np.load(self.matrix_path, mmap_mode="r" if meta["rows"] else None)
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, ValueError, OSError):
+            return
+        if (
+            matrix.ndim != 2
+            or matrix.dtype != self.dtype
+            or matrix.shape[0] != meta["rows"]
+            or (self.dim is not None and matrix.shape[1] != self.dim)
+        ):
+            return
+        index = meta["entries"]
+        base_rows = matrix.shape[0]
+        tail_rows, tail, torn = self._load_tail(index, base_rows, matrix.shape[1])
+        with self._lock:
+            self.dim = matrix.shape[1]
+            self._matrix = matrix
+            self._base_rows = base_rows
+            self._tail = tail
+            self._tail_rows = tail_rows
+            self._needs_compaction = torn
+            self._index = index
+
+    def _load_tail(self, index: dict, base_rows: int, dim: int):
+        """Replay the append log into ``index``; return (tail rows, tail memmap, torn).
+
+        Replay stops at the first entry that is unreadable or points past the
+        rows actually in the tail file (an interrupted save); ``torn`` then
+        asks the next save to compact the files back into a clean state.
+        """
+        try:
+            lines = self.log_path.read_text().splitlines()
+        except FileNotFoundError:
+            return 0, None, False
+        try:
+            available = self.tail_path.stat().st_size // (dim * self.dtype.itemsize)
+        except (FileNotFoundError, ZeroDivisionError):
+            available = 0
+        tail_rows = 0
+        torn = False
+        for line in lines:
+            try:
+                path, row, mtime, count = json.loads(line)
+            except (json.JSONDecodeError, ValueError, TypeError):
+                torn = True
+                break
+            if row != base_rows + tail_rows or tail_rows + count > available:
+                torn = True
+                break
+            index[path] = [row, mtime, count]
+            tail_rows += count
+        return tail_rows, self._map_tail(tail_rows, dim), torn
+
+    def _map_tail(self, rows: int, dim: int):
+        if not rows:
+            return None
+        return np.memmap(self.tail_path, dtype=self.dtype, mode="r", shape=(rows, dim))
+
+    def _rows(self, row: int, count: int) -> np.ndarray:
+        if count == 0:  # e.g. an image without faces; may sit past the last row
+            return np.empty((0, self.dim), self.dtype)
+        if row < self._base_rows:
+            return self._matrix[row : row + count]
+        row -= self._base_rows
+        return self._tail[row : row + count]
+
+    def get(self, path: str, mtime: float) -> np.ndarray | None:
+        """Return the cached rows for ``path``, or None if missing or stale."""
+        with self._lock:
+            pending = self._pending.get(path)
+            if pending is not None:
+                return pending[1] if pending[0] == mtime else None
+            entry = self._index.get(path)
+            if entry is None or entry[1] != mtime:
+                return None
+            row, _, count = entry
+            return self._rows(row, count)
+
+    def put(self, path: str, mtime: float, rows):
+        rows = np.asarray(rows, dtype=self.dtype)
+        with self._lock:
+            if self.dim is None:
+                self.dim = rows.shape[-1]
+            self._pending[path] = (mtime, rows.reshape(-1, self.dim))
+
+    def save(self):
+        with self._lock:
+            if not self._pending:
+                return
+            if (
+                self._matrix is None
+                or self._needs_compaction
+                or self._pending.keys() & self._index.keys()
+                or self._tail_rows > self._base_rows
+            ):
+                self._compact_locked()
+            else:
+                self._append_locked()
+
+    def _append_locked(self):
+        """Append pending rows to the tail file and their entries to the log."""
+        row = self._base_rows + self._tail_rows
+        entries = []
+        with open(self.tail_path, "r+b" if self.tail_path.exists() else "wb") as f:
+            # Bytes past the logged rows belong to an interrupted save
+            f.seek(self._tail_rows * self.dim * self.dtype.itemsize)
+            for path, (mtime, rows) in self._pending.items():
+                f.write(np.ascontiguousarray(rows).tobytes())
+                entries.append([path, row, mtime, len(rows)])
+                row += len(rows)
+            f.truncate()
+        # The log is written after the rows it points to, so a crash never
+        # leaves an entry without its data
+        with open(self.log_path, "a") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+
+        self._tail_rows = row - self._base_rows
+        for path, start, mtime, count in entries:
+            self._index[path] = [start, mtime, count]
+        self._tail = self._map_tail(self._tail_rows, self.dim)
+        self._pending.clear()
+
+    def _compact_locked(self):
+        """Rewrite base matrix and index with tail and pending rows folded in."""
+        index = {}
+        chunks = []
+        total = 0
+        if self._pending.keys() & self._index.keys():
+            # Some paths were re-encoded: compact their old rows away
+            for path, (row, mtime, count) in self._index.items():
+                if path in self._pending:
+                    continue
+                chunks.append(self._rows(row, count))
+                index[path] = [total, mtime, count]
+                total += count
+        else:
+            for part in (self._matrix, self._tail):
+                if part is not None:
+                    chunks.append(part)
+            index.update(self._index)
+            total = self._base_rows + self._tail_rows
+        for path, (mtime, rows) in self._pending.items():
+            chunks.append(rows)
+            index[path] = [total, mtime, len(rows)]
+            total += len(rows)
+
+        matrix = np.concatenate(chunks) if chunks else np.empty((0, self.dim), self.dtype)
+
+        # Drop the log before the tail and both before the new base lands, so
+        # a crash never pairs a log with a base it wasn't written against
+        self.log_path.unlink(missing_ok=True)
+        self.tail_path.unlink(missing_ok=True)
+
+        # Write to temp files and swap them in, so a mapped old matrix stays valid
+        tmp_matrix = self.matrix_path.with_name(self.matrix_path.name + ".tmp")
+        with open(tmp_matrix, "wb") as f:
+            np.save(f, matrix)
+        os.replace(tmp_matrix, self.matrix_path)
+        tmp_index = self.index_path.with_name(self.index_path.name + ".tmp")
+        tmp_index.write_text(json.dumps({"tag": self.tag, "rows": total, "entries": index}))
+        os.replace(tmp_index, self.index_path)
+
+        self._matrix = np.load(self.matrix_path, mmap_mode="r" if total else None)
+        self._base_rows = total
+        self._tail = None
+        self._tail_rows = 0
+        self._needs_compaction = False
+        self._index = index
+        self._pending.clear()
+
+
+def quantize_int8(vectors: np.ndarray) -> np.ndarray:
+    """Scale each vector into the int8 range.
+
+    Every vector gets its own scale, which cosine similarity ignores, so
+    no scale needs to be stored alongside the quantized values.
+    """
+    vectors = np.atleast_2d(vectors).astype(np.float32)
+    max_abs = np.maximum(np.abs(vectors).max(axis=-1, keepdims=True), 1e-12)
+    return np.round(vectors * (127.0 / max_abs)).clip(-127, 127).astype(np.int8)
+
+
+def cosine_scores(features: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Cosine similarity of every int8 row of ``features`` against an int8 ``query``."""
+    if simsimd is not None:
+        return 1.0 - np.asarray(
+            simsimd.cdist(features, query[None, :], metric="cosine")
+        ).ravel()
+    features = features.astype(np.float32)
+    query = query.astype(np.float32)
+    norms = np.linalg.norm(features, axis=1) * np.linalg.norm(query)
+    return (features @ query) / np.maximum(norms, 1e-12)
+
+
+def _best_face_distances_numpy(all_faces, offsets, refs):
+    """Smallest L2 distance from each image's faces to any reference.
+
+    ``all_faces`` holds every face row (float32, (M, 128)); image ``i`` owns
+    rows ``offsets[i]:offsets[i + 1]``. Images without faces get ``inf``.
+    """
+    best = np.full(len(offsets) - 1, np.inf, dtype=np.float32)
+    if not len(all_faces):
+        return best
+    # Squared L2 distances expand to |r|^2 + |f|^2 - 2 f.r: one matmul for all faces
+    d2 = (
+        (refs * refs).sum(axis=1)[None, :]
+        + (all_faces * all_faces).sum(axis=1)[:, None]
+        - 2.0 * all_faces @ refs.T
+    )
+    per_face = np.sqrt(np.maximum(d2.min(axis=1), 0.0))
+    has_faces = np.diff(offsets) > 0
+    best[has_faces] = np.minimum.reduceat(per_face, offsets[:-1][has_faces])
+    return best
+
+
+if njit is not None:
+    # No "nnan"/"ninf" fast-math flags: images without faces score inf
+    @njit(parallel=True, fastmath={"reassoc", "contract"}, cache=True)
+    def best_face_distances(all_faces, offsets, refs):
+        """JIT-compiled, image-parallel twin of ``_best_face_distances_numpy``."""
+        n = offsets.shape[0] - 1
+        best = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            b = np.inf
+            for j in range(offsets[i], offsets[i + 1]):
+                for r in range(refs.shape[0]):
+                    d = np.float32(0.0)
+                    for k in range(refs.shape[1]):
+                        diff = all_faces[j, k] - refs[r, k]
+                        d += diff * diff
+                    if d < b:
+                        b = d
+            best[i] = np.sqrt(b)
+        return best
+else:
+    best_face_distances = _best_face_distances_numpy
+
+
+def thumbnail_jpeg(img: Image.Image) -> bytes:
+    """Encode a small JPEG thumbnail of an already decoded image."""
+    thumb = img.copy()
+    thumb.thumbnail(THUMBNAIL_SIZE, Image.BILINEAR)
+    buf = io.BytesIO()
+    thumb.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+def load_thumbnail(path: Path, jpeg: bytes | None = None) -> Image.Image | None:
+    """Decode a result thumbnail from cached JPEG bytes, or from the source image.
+
+    The source is decoded at a reduced scale so libjpeg skips most pixels.
+    """
+    try:
+        if jpeg is not None:
+            img = Image.open(io.BytesIO(jpeg))
+            img.load()
+            return img
+        img = Image.open(path)
+        img.draft("RGB", THUMBNAIL_SIZE)
+        img = img.convert("RGB")
+        img.thumbnail(THUMBNAIL_SIZE, Image.BILINEAR)
+        return img
+    except Exception:
+        return None
+
+
+def cpu_has_native_bf16() -> bool:
+    """Whether oneDNN reports hardware bfloat16 support on this CPU."""
+    try:
+        return (
+            torch.backends.mkldnn.is_available()
+            and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+        )
+    except (AttributeError, RuntimeError):  # older torch without the probe
+        return False
+
+
+def to_inference_dtype(model, device: str, side: int | None):
+    """Cast the model to float16 on CUDA, or bfloat16 on CPUs with native bf16.
+
+    Returns the model and the dtype inputs must use. CPUs without native
+    bf16 (AVX-512-BF16/AMX) would emulate it, which is slower than float32,
+    so they stay in float32, as does any device where a half-precision
+    forward pass fails.
+    """
+    if device == "cuda":
+        dtype = torch.float16
+    elif device == "cpu" and cpu_has_native_bf16():
+        dtype = torch.bfloat16
+    else:
+        return model.float(), torch.float32
+
+    side = side or 224
+    try:
+        model = model.to(dtype)
+        with torch.no_grad():
+            model.encode_image(torch.zeros(1, 3, side, side, device=device, dtype=dtype))
+        return model, dtype
+    except Exception:
+        return model.float(), torch.float32
+
+
+def compile_visual(model, device: str, dtype: torch.dtype, batch_size: int, side: int | None):
+    """Compile the image tower and run one warm-up batch.
+
+    After reparameterization the tower is a static graph, so torch.compile
+    can fuse it. The default mode is used rather than "reduce-overhead":
+    CUDA graphs recorded on one thread are unsafe to replay from another,
+    and they bring nothing on CPU. Falls back to TorchScript tracing when
+    torch.compile is unavailable, and to eager mode if neither works on
+    this platform.
+    """
+    side = side or 224
+    dummy = torch.zeros(batch_size, 3, side, side, device=device, dtype=dtype)
+    eager = model.visual
+    try:
+        with torch.no_grad():
+            if hasattr(torch, "compile"):
+                model.visual = torch.compile(eager, fullgraph=True)
+            else:
+                model.visual = torch.jit.trace(eager, dummy)
+            model.visual(dummy)
+    except Exception:
+        model.visual = eager
+    return model
+
+
+def encode_padded(model, batch, batch_size: int):
+    """Encode one image batch, zero-padding a short batch to ``batch_size``.
+
+    compile_visual warms the tower up at ``batch_size`` only; running the
+    last, partial batch at its own size would compile a second graph
+    mid-loop, outside the eager fallback.
+    """
+    count = len(batch)
+    if count < batch_size:
+        batch = torch.cat([batch, batch.new_zeros((batch_size - count, *batch.shape[1:]))])
+    return model.encode_image(batch)[:count]
+
+
+class ImageDataset(Dataset):
+    """Decodes and preprocesses images on DataLoader workers.
+
+    Each item also carries a JPEG thumbnail cut from the same decode, so
+    results can be displayed without opening the source file again.
+    Unreadable files yield ``None`` instead of a tensor so a single bad file
+    doesn't abort the whole search; ``collate_readable`` drops them.
+    """
+
+    def __init__(self, paths: list[Path], preprocess):
+        self.paths = paths
+        self.preprocess = preprocess
+        self.side = preprocess_size(preprocess)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, idx):
+        try:
+            img = open_downscaled(self.paths[idx], self.side)
+            return idx, self.preprocess(img), thumbnail_jpeg(img)
+        except Exception:
+            return idx, None, None
+
+
+def collate_readable(items):
+    """Stack readable images, returning (dataset indices, batch tensor or None, thumbnails)."""
+    items = [item for item in items if item[1] is not None]
+    if not items:
+        return [], None, []
+    indices, tensors, thumbs = zip(*items)
+    return list(indices), torch.stack(tensors), list(thumbs)
 
 
 class App:
@@ -37,13 +514,22 @@ class App:
         self.preprocess = None
         self.tokenizer = None
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.dtype = torch.float32
         self._searching = False
 
         self._face_recognition = None  # lazy import
+        self._face_use_cnn = False  # batched CNN detection when dlib has CUDA
+        self._face_model_lock = threading.Lock()  # dlib models are not thread-safe
+        self._decode_pool = ThreadPoolExecutor(max_workers=LOADER_WORKERS)
+        self._face_cache = None
+        self._face_cache_lock = threading.Lock()
+        self._indexer_thread = None
+        self._indexer_stop = threading.Event()
 
         self._build_ui()
         self._load_config()
         self._refresh_enrolled_list()
+        self._start_face_indexer()
 
     # ------------------------------------------------------------------ #
     #  UI
@@ -193,56 +679,261 @@ class App:
         if path:
             self.dir_var.set(path)
             self._save_config()
+            self._start_face_indexer()
 
     # ------------------------------------------------------------------ #
     #  Face registry persistence
     # ------------------------------------------------------------------ #
 
-    def _load_face_registry(self) -> dict:
+    def _open_face_registry(self) -> sqlite3.Connection:
+        """Open the registry, one row per enrolled photo with its raw float64 encoding."""
+        is_new = not FACE_REGISTRY_PATH.exists()
+        conn = sqlite3.connect(FACE_REGISTRY_PATH)
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS people "
+                "(name TEXT NOT NULL, source TEXT NOT NULL, enc BLOB NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_people_name ON people(name)")
+            if is_new:
+                self._import_legacy_face_registry(conn)
+        return conn
+
+    @staticmethod
+    def _import_legacy_face_registry(conn: sqlite3.Connection):
+        """Carry over people enrolled while the registry was a JSON file."""
         try:
-            return json.loads(FACE_REGISTRY_PATH.read_text())
+            registry = json.loads(LEGACY_FACE_REGISTRY_PATH.read_text())
         except (FileNotFoundError, json.JSONDecodeError):
-            return {"people": {}}
+            return
+        conn.executemany(
+            "INSERT INTO people (name, source, enc) VALUES (?, ?, ?)",
+            [
+                (name, e["source"], np.asarray(e["encoding"], dtype=np.float64).tobytes())
+                for name, person in registry.get("people", {}).items()
+                for e in person["embeddings"]
+            ],
+        )
+
+    def _enrolled_counts(self) -> dict[str, int]:
+        with closing(self._open_face_registry()) as conn:
+            rows = conn.execute(
+                "SELECT name, COUNT(*) FROM people GROUP BY name ORDER BY name"
+            ).fetchall()
+        return dict(rows)
 
-    def _save_face_registry(self, registry: dict):
-        FACE_REGISTRY_PATH.write_text(json.dumps(registry))
+    def _person_encodings(self, name: str) -> list[np.ndarray]:
+        with closing(self._open_face_registry()) as conn:
+            rows = conn.execute("SELECT enc FROM people WHERE name = ?", (name,)).fetchall()
+        return [np.frombuffer(enc, dtype=np.float64) for (enc,) in rows]
 
     # ------------------------------------------------------------------ #
     #  Face cache persistence
     # ------------------------------------------------------------------ #
 
-    def _load_face_cache(self) -> dict:
-        try:
-            return json.loads(FACE_CACHE_PATH.read_text())
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+    def _load_face_cache(self) -> EmbeddingCache:
+        cache = EmbeddingCache(
+            FACE_CACHE_PATH, FACE_CACHE_INDEX_PATH, tag="face_recognition", dim=FACE_ENCODING_DIM
+        )
+        cache.load()
+        return cache
+
+    def _shared_face_cache(self) -> EmbeddingCache:
+        """Face cache shared by face search and the background indexer."""
+        with self._face_cache_lock:
+            if self._face_cache is None:
+                self._face_cache = self._load_face_cache()
+            return self._face_cache
+
+    # ------------------------------------------------------------------ #
+    #  CLIP embedding cache persistence
+    # ------------------------------------------------------------------ #
+
+    def _load_clip_cache(self) -> EmbeddingCache:
+        cache = EmbeddingCache(
+            CLIP_CACHE_PATH, CLIP_CACHE_INDEX_PATH, tag=MODEL_NAME, dtype=np.int8
+        )
+        cache.load()
+        return cache
 
-    def _save_face_cache(self, cache: dict):
-        FACE_CACHE_PATH.write_text(json.dumps(cache))
+    def _load_thumb_cache(self) -> EmbeddingCache:
+        # Variable-length JPEG bytes: each byte is a one-column uint8 row
+        cache = EmbeddingCache(
+            THUMB_CACHE_PATH, THUMB_CACHE_INDEX_PATH, tag="jpeg", dim=1, dtype=np.uint8
+        )
+        cache.load()
+        return cache
 
     # ------------------------------------------------------------------ #
     #  Lazy face_recognition import
     # ------------------------------------------------------------------ #
 
-    def _ensure_face_recognition(self) -> bool:
+    def _import_face_recognition(self) -> bool:
         if self._face_recognition is not None:
             return True
         try:
+            import dlib
             import face_recognition
 
             self._face_recognition = face_recognition
+            self._face_use_cnn = bool(getattr(dlib, "DLIB_USE_CUDA", False))
             return True
         except ImportError:
-            messagebox.showerror(
-                "Missing dependency",
-                "The 'face_recognition' package is not installed.\n\n"
-                "Install it with:\n"
-                "  pip install face_recognition\n\n"
-                "On macOS you may also need:\n"
-                "  xcode-select --install",
-            )
             return False
 
+    def _ensure_face_recognition(self) -> bool:
+        if self._import_face_recognition():
+            return True
+        messagebox.showerror(
+            "Missing dependency",
+            "The 'face_recognition' package is not installed.\n\n"
+            "Install it with:\n"
+            "  pip install face_recognition\n\n"
+            "On macOS you may also need:\n"
+            "  xcode-select --install",
+        )
+        return False
+
+    # ------------------------------------------------------------------ #
+    #  Face encoding + background indexer
+    # ------------------------------------------------------------------ #
+
+    def _encode_faces(self, path_strs: list[str]) -> list[np.ndarray]:
+        """Detect and encode faces in a batch of images, one (F, 128) array per image."""
+        fr = self._face_recognition
+
+        # Decode on the pool (PIL releases the GIL) while holding no model lock,
+        # so one batch decodes while another is being detected
+        images = list(self._decode_pool.map(self._load_face_image, path_strs))
+
+        results = []
+        with self._face_model_lock:
+            for image, locations in zip(images, self._detect_faces(images)):
+                try:
+                    if locations:
+                        face_encodings = fr.face_encodings(image, known_face_locations=locations)
+                    else:
+                        face_encodings = []
+                except Exception:
+                    face_encodings = []
+                results.append(
+                    np.reshape(face_encodings, (-1, FACE_ENCODING_DIM)).astype(np.float32)
+                )
+        return results
+
+    def _load_face_image(self, path_str: str) -> np.ndarray | None:
+        try:
+            return self._face_recognition.load_image_file(path_str)
+        except Exception:
+            return None
+
+    def _detect_faces(self, images: list) -> list[list]:
+        """Face locations per image (None images get none).
+
+        Detection cost grows with pixel count, so it runs on a copy strided
+        down to at most FACE_DETECT_MAX_SIDE; locations are scaled back to
+        the full image, where the (fixed cost per face) encoding happens.
+        With a CUDA build of dlib the CNN detector runs batched on the GPU;
+        it needs equally sized images, so batches are grouped by shape.
+        Otherwise, or if a batch fails, HOG runs image by image on the CPU.
+        """
+        fr = self._face_recognition
+        locations = [[] for _ in images]
+        pending = [i for i, image in enumerate(images) if image is not None]
+        scales = [
+            -(-max(image.shape[:2]) // FACE_DETECT_MAX_SIDE) if image is not None else 1
+            for image in images
+        ]
+        small = [
+            np.ascontiguousarray(image[::scale, ::scale]) if image is not None else None
+            for image, scale in zip(images, scales)
+        ]
+
+        if self._face_use_cnn:
+            by_shape = {}
+            for i in pending:
+                by_shape.setdefault(small[i].shape, []).append(i)
+            pending = []
+            for indices in by_shape.values():
+                try:
+                    batch_locations = fr.batch_face_locations(
+                        [small[i] for i in indices], batch_size=FACE_BATCH_SIZE
+                    )
+                except Exception:
+                    pending.extend(indices)
+                    continue
+                for i, locs in zip(indices, batch_locations):
+                    locations[i] = locs
+
+        for i in pending:
+            try:
+                locations[i] = fr.face_locations(small[i], model="hog")
+            except Exception:
+                pass
+
+        for i, image in enumerate(images):
+            scale = scales[i]
+            if image is None or scale == 1:
+                continue
+            height, width = image.shape[:2]
+            locations[i] = [
+                (top * scale, min(right * scale, width), min(bottom * scale, height), left * scale)
+                for top, right, bottom, left in locations[i]
+            ]
+        return locations
+
+    def _start_face_indexer(self):
+        """(Re)start background face indexing of the selected image directory.
+
+        Runs only when someone is enrolled and face_recognition is importable,
+        so searches mostly hit the cache instead of running detection. The
+        import itself happens on the indexer thread, keeping dlib's load time
+        off the UI thread at startup and on directory change.
+        """
+        self._indexer_stop.set()
+        image_dir = self.dir_var.get().strip()
+        if not image_dir or not Path(image_dir).is_dir():
+            return
+        if not self._enrolled_counts():
+            return
+
+        self._indexer_stop = threading.Event()
+        self._indexer_thread = threading.Thread(
+            target=self._index_faces, args=(Path(image_dir), self._indexer_stop), daemon=True
+        )
+        self._indexer_thread.start()
+
+    def _index_faces(self, image_dir: Path, stop: threading.Event):
+        if not self._import_face_recognition():
+            return
+        try:
+            cache = self._shared_face_cache()
+            entries = []
+            for p in collect_images(image_dir):
+                try:
+                    entries.append((os.path.getmtime(p), str(p)))
+                except OSError:
+                    continue
+
+            # Newest images first: those are the most likely to be searched
+            entries.sort(reverse=True)
+            missing = [(m, p) for m, p in entries if cache.get(p, m) is None]
+            unsaved = 0
+            for start in range(0, len(missing), FACE_BATCH_SIZE):
+                if stop.is_set():
+                    break
+                batch = missing[start : start + FACE_BATCH_SIZE]
+                encoded = self._encode_faces([path_str for _, path_str in batch])
+                for (mtime, path_str), faces in zip(batch, encoded):
+                    cache.put(path_str, mtime, faces)
+                unsaved += len(batch)
+                if unsaved >= FACE_INDEX_SAVE_EVERY:
+                    cache.save()
+                    unsaved = 0
+            cache.save()
+        except Exception:
+            pass  # best effort: face search encodes anything left uncached
+
     # ------------------------------------------------------------------ #
     #  Enrollment
     # ------------------------------------------------------------------ #
@@ -285,7 +976,7 @@ class App:
             return
 
         encodings = fr.face_encodings(image, known_face_locations=locations)
-        encoding = encodings[0].tolist()
+        encoding = encodings[0].astype(np.float64).tobytes()
 
         name = simpledialog.askstring("Person name", "Enter name for this person:")
         if not name or not name.strip():
@@ -293,24 +984,22 @@ class App:
             return
         name = name.strip()
 
-        registry = self._load_face_registry()
-        if name not in registry["people"]:
-            registry["people"][name] = {"embeddings": []}
-
-        registry["people"][name]["embeddings"].append(
-            {"source": file_path, "encoding": encoding}
-        )
-        self._save_face_registry(registry)
+        with closing(self._open_face_registry()) as conn, conn:
+            conn.execute(
+                "INSERT INTO people (name, source, enc) VALUES (?, ?, ?)",
+                (name, file_path, encoding),
+            )
         self._refresh_enrolled_list()
         self._set_status(f"Enrolled face for '{name}'.")
+        if self._indexer_thread is None or not self._indexer_thread.is_alive():
+            self._start_face_indexer()
 
     def _refresh_enrolled_list(self):
-        registry = self._load_face_registry()
-        names = sorted(registry["people"].keys())
+        counts = self._enrolled_counts()
+        names = list(counts)
 
         self.enrolled_listbox.delete(0, tk.END)
-        for name in names:
-            count = len(registry["people"][name]["embeddings"])
+        for name, count in counts.items():
             self.enrolled_listbox.insert(tk.END, f"{name} ({count} photo{'s' if count != 1 else ''})")
 
         self.person_combo["values"] = names
@@ -323,15 +1012,14 @@ class App:
             messagebox.showinfo("Remove", "Select a person from the list first.")
             return
 
-        registry = self._load_face_registry()
-        names = sorted(registry["people"].keys())
+        names = list(self._enrolled_counts())
         name = names[sel[0]]
 
         if not messagebox.askyesno("Confirm", f"Remove '{name}' and all enrolled photos?"):
             return
 
-        del registry["people"][name]
-        self._save_face_registry(registry)
+        with closing(self._open_face_registry()) as conn, conn:
+            conn.execute("DELETE FROM people WHERE name = ?", (name,))
         self._refresh_enrolled_list()
         self._set_status(f"Removed '{name}'.")
 
@@ -364,16 +1052,11 @@ class App:
             self._set_status("Max distance must be a number.")
             return
 
-        registry = self._load_face_registry()
-        if person not in registry["people"]:
+        reference_encodings = self._person_encodings(person)
+        if not reference_encodings:
             self._set_status(f"Person '{person}' not found in registry.")
             return
 
-        reference_encodings = [
-            np.array(e["encoding"])
-            for e in registry["people"][person]["embeddings"]
-        ]
-
         self._searching = True
         self._disable_search_buttons()
         self._clear_results()
@@ -393,12 +1076,8 @@ class App:
         reference_encodings: list,
         max_distance: float,
     ):
-        fr = self._face_recognition
         try:
-            image_paths = sorted(
-                p for p in image_dir.iterdir()
-                if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS
-            )
+            image_paths = collect_images(image_dir)
             if not image_paths:
                 self.root.after(0, self._set_status, "No images found in directory.")
                 self.root.after(0, self._finish_face_search)
@@ -407,60 +1086,58 @@ class App:
             total = len(image_paths)
             self.root.after(0, self._set_status, f"Scanning {total} images for '{person}'...")
 
-            cache = self._load_face_cache()
+            cache = self._shared_face_cache()
             results = []
 
-            for i, path in enumerate(image_paths):
-                path_str = str(path)
-                try:
-                    mtime = os.path.getmtime(path_str)
-                except OSError:
-                    continue
+            refs = np.ascontiguousarray(np.stack(reference_encodings), dtype=np.float32)
 
-                # Check cache
-                cached = cache.get(path_str)
-                if cached and cached.get("mtime") == mtime:
-                    face_encodings = [np.array(e) for e in cached["encodings"]]
-                else:
-                    # Detect and encode faces
+            for start in range(0, total, FACE_BATCH_SIZE):
+                chunk_faces = {}
+                missing = []
+                for path in image_paths[start : start + FACE_BATCH_SIZE]:
+                    path_str = str(path)
                     try:
-                        image = fr.load_image_file(path_str)
-                        locations = fr.face_locations(image, model="hog")
-                        if locations:
-                            face_encodings = fr.face_encodings(image, known_face_locations=locations)
-                        else:
-                            face_encodings = []
-                    except Exception:
-                        face_encodings = []
+                        mtime = os.path.getmtime(path_str)
+                    except OSError:
+                        continue
 
-                    # Update cache
-                    cache[path_str] = {
-                        "mtime": mtime,
-                        "encodings": [e.tolist() for e in face_encodings],
-                    }
-
-                # Compare against reference embeddings
-                if face_encodings:
-                    best_distance = float("inf")
-                    for face_enc in face_encodings:
-                        distances = fr.face_distance(reference_encodings, face_enc)
-                        min_dist = float(np.min(distances))
-                        if min_dist < best_distance:
-                            best_distance = min_dist
-
-                    if best_distance <= max_distance:
-                        results.append((path, best_distance))
-
-                # Progress update every 20 images
-                if (i + 1) % 20 == 0 or i + 1 == total:
-                    progress_msg = (
-                        f"Scanning {i + 1}/{total}... "
-                        f"({len(results)} match{'es' if len(results) != 1 else ''} so far)"
+                    # Check cache
+                    cached = cache.get(path_str, mtime)
+                    if cached is not None:
+                        chunk_faces[path] = cached.astype(np.float32)
+                    else:
+                        missing.append((path, mtime))
+
+                # Detect and encode uncached images as one batch
+                if missing:
+                    encoded = self._encode_faces([str(path) for path, _ in missing])
+                    for (path, mtime), faces in zip(missing, encoded):
+                        cache.put(str(path), mtime, faces)
+                        chunk_faces[path] = faces
+
+                # Compare the whole batch against reference embeddings at once
+                if chunk_faces:
+                    chunk_paths = list(chunk_faces)
+                    offsets = np.zeros(len(chunk_paths) + 1, dtype=np.int64)
+                    offsets[1:] = np.cumsum([len(chunk_faces[p]) for p in chunk_paths])
+                    all_faces = np.ascontiguousarray(
+                        np.concatenate([chunk_faces[p] for p in chunk_paths]), dtype=np.float32
                     )
-                    self.root.after(0, self._set_status, progress_msg)
+                    best = best_face_distances(all_faces, offsets, refs)
+                    for path, best_distance in zip(chunk_paths, best):
+                        if best_distance <= max_distance:
+                            results.append((path, float(best_distance)))
+
+                # Progress update after every batch
+                done = min(start + FACE_BATCH_SIZE, total)
+                progress_msg = (
+                    f"Scanning {done}/{total}... "
+                    f"({len(results)} match{'es' if len(results) != 1 else ''} so far)"
+                )
+                self.root.after(0, self._set_status, progress_msg)
 
             # Save updated cache
-            self._save_face_cache(cache)
+            cache.save()
 
             # Sort by distance ascending, display score as 1 - distance
             results.sort(key=lambda x: x[1])
@@ -540,10 +1217,7 @@ class App:
     def _run_search(self, query: str, image_dir: Path, threshold_pct: float):
         try:
             # Collect images
-            image_paths = sorted(
-                p for p in image_dir.iterdir()
-                if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS
-            )
+            image_paths = collect_images(image_dir)
             if not image_paths:
                 self.root.after(0, self._set_status, "No images found in directory.")
                 self.root.after(0, self._finish_search)
@@ -567,75 +1241,122 @@ class App:
                 model.eval()
                 model = reparameterize_model(model)
                 model = model.to(self.device)
+                side = preprocess_size(preprocess)
+                model, self.dtype = to_inference_dtype(model, self.device, side)
+                model = compile_visual(model, self.device, self.dtype, BATCH_SIZE, side)
 
                 self.model = model
                 self.preprocess = preprocess
                 self.tokenizer = tokenizer
 
-            # Encode images (skip unreadable files)
-            self.root.after(0, self._set_status, "Encoding images...")
-            valid_paths = []
-            all_image_features = []
-            for i in range(0, len(image_paths), BATCH_SIZE):
-                batch_paths = image_paths[i : i + BATCH_SIZE]
-                tensors = []
-                kept = []
-                for p in batch_paths:
-                    try:
-                        tensors.append(self.preprocess(Image.open(p).convert("RGB")))
-                        kept.append(p)
-                    except Exception:
-                        continue
-                if not tensors:
+            # Encode only images that are new or changed since the last search
+            # (unreadable files are skipped and never cached)
+            cache = self._load_clip_cache()
+            thumb_cache = self._load_thumb_cache()
+            mtimes = {}
+            embs = {}
+            stale = []
+            for p in image_paths:
+                try:
+                    mtimes[p] = os.path.getmtime(p)
+                except OSError:
                     continue
-                valid_paths.extend(kept)
-                batch_tensors = torch.stack(tensors).to(self.device)
-
-                with torch.no_grad(), torch.amp.autocast(
-                    self.device, enabled=(self.device == "cuda")
-                ):
-                    features = self.model.encode_image(batch_tensors)
-                    features /= features.norm(dim=-1, keepdim=True)
-
-                all_image_features.append(features.cpu())
+                cached = cache.get(str(p), mtimes[p])
+                if cached is None or thumb_cache.get(str(p), mtimes[p]) is None:
+                    stale.append(p)
+                else:
+                    embs[p] = cached[0]
 
-            if not all_image_features:
+            if stale:
+                self.root.after(
+                    0, self._set_status, f"Encoding {len(stale)} new images..."
+                )
+                loader = DataLoader(
+                    ImageDataset(stale, self.preprocess),
+                    batch_size=BATCH_SIZE,
+                    num_workers=LOADER_WORKERS,
+                    pin_memory=(self.device == "cuda"),
+                    prefetch_factor=2,
+                    collate_fn=collate_readable,
+                )
+                # Features stay on the device until every batch is encoded,
+                # so the loop never blocks on a device-to-host copy
+                stale_features = None
+                encoded = []
+                for indices, batch, thumbs in loader:
+                    if batch is None:
+                        continue
+                    for idx, jpeg in zip(indices, thumbs):
+                        path = stale[idx]
+                        thumb_cache.put(str(path), mtimes[path], np.frombuffer(jpeg, np.uint8))
+                    batch_tensors = batch.to(self.device, dtype=self.dtype, non_blocking=True)
+
+                    with torch.no_grad():
+                        features = encode_padded(self.model, batch_tensors, BATCH_SIZE).float()
+                        features /= features.norm(dim=-1, keepdim=True)
+
+                    if stale_features is None:
+                        stale_features = torch.empty(
+                            (len(stale), features.shape[-1]),
+                            device=self.device,
+                            dtype=torch.float16,
+                        )
+                    stale_features[torch.as_tensor(indices, device=self.device)] = features.half()
+                    encoded.extend(indices)
+
+                if encoded:
+                    batch_embs = quantize_int8(stale_features[encoded].float().cpu().numpy())
+                    for idx, emb in zip(encoded, batch_embs):
+                        path = stale[idx]
+                        cache.put(str(path), mtimes[path], emb)
+                        embs[path] = emb
+
+                cache.save()
+                thumb_cache.save()
+
+            image_paths = [p for p in image_paths if p in embs]
+            if not image_paths:
                 self.root.after(0, self._set_status, "No readable images found.")
                 self.root.after(0, self._finish_search)
                 return
 
-            image_features = torch.cat(all_image_features, dim=0)
-            image_paths = valid_paths
+            image_features = np.stack([embs[p] for p in image_paths])
 
             # Encode text
             self.root.after(0, self._set_status, "Encoding query...")
             tokens = self.tokenizer([query]).to(self.device)
-            with torch.no_grad(), torch.amp.autocast(
-                self.device, enabled=(self.device == "cuda")
-            ):
-                text_features = self.model.encode_text(tokens)
+            with torch.no_grad():
+                text_features = self.model.encode_text(tokens).float()
                 text_features /= text_features.norm(dim=-1, keepdim=True)
-            text_features = text_features.cpu()
+            text_features = quantize_int8(text_features.float().cpu().numpy())[0]
 
             # Rank
-            similarities = (image_features @ text_features.T).squeeze(1)
-            ranked_indices = similarities.argsort(descending=True)
-
-            top_score = similarities[ranked_indices[0]].item()
+            similarities = cosine_scores(image_features, text_features)
+            top_score = float(similarities.max())
             cutoff = top_score * (threshold_pct / 100.0) if top_score > 0 else 0.0
 
-            results = [
-                (image_paths[idx], similarities[idx].item())
-                for idx in ranked_indices
-                if similarities[idx].item() >= cutoff
-            ]
-
-            self.root.after(0, self._show_results, results)
+            # Threshold first, then partially sort just the best MAX_RESULTS
+            candidates = np.flatnonzero(similarities >= cutoff)
+            matched = len(candidates)
+            if matched > MAX_RESULTS:
+                top = np.argpartition(-similarities[candidates], MAX_RESULTS - 1)
+                candidates = candidates[top[:MAX_RESULTS]]
+            ranked_indices = candidates[np.argsort(-similarities[candidates])]
+
+            results = [(image_paths[idx], float(similarities[idx])) for idx in ranked_indices]
+            thumbnails = {}
+            for path, _ in results:
+                jpeg = thumb_cache.get(str(path), mtimes[path])
+                if jpeg is not None:
+                    thumbnails[path] = jpeg.tobytes()
+
+            self.root.after(0, self._show_results, results, thumbnails)
+            shown = f" (showing top {len(results)})" if len(results) < matched else ""
             self.root.after(
                 0,
                 self._set_status,
-                f"Done. {len(results)} of {len(image_paths)} images above "
-                f"{threshold_pct:.0f}% of top score ({top_score:.4f}) for \"{query}\".",
+                f"Done. {matched} of {len(image_paths)} images above "
+                f"{threshold_pct:.0f}% of top score ({top_score:.4f}) for \"{query}\"{shown}.",
             )
 
         except Exception as exc:
@@ -657,19 +1378,30 @@ class App:
             widget.destroy()
         self._photo_refs.clear()
 
-    def _show_results(self, results: list[tuple[Path, float]]):
+    def _show_results(
+        self,
+        results: list[tuple[Path, float]],
+        cached_thumbnails: dict[Path, bytes] | None = None,
+    ):
         self._clear_results()
-        for path, score in results:
+        cached_thumbnails = cached_thumbnails or {}
+
+        # Decode thumbnails in parallel; PhotoImage itself must be built on the Tk thread
+        paths = [path for path, _ in results]
+        with ThreadPoolExecutor(max_workers=LOADER_WORKERS) as pool:
+            thumbnails = list(
+                pool.map(load_thumbnail, paths, [cached_thumbnails.get(p) for p in paths])
+            )
+
+        for (path, score), img in zip(results, thumbnails):
             row = tk.Frame(self.results_frame, bd=1, relief=tk.RIDGE)
             row.pack(fill=tk.X, pady=2, padx=2)
 
-            try:
-                img = Image.open(path).convert("RGB")
-                img.thumbnail(THUMBNAIL_SIZE)
+            if img is not None:
                 photo = ImageTk.PhotoImage(img)
                 self._photo_refs.append(photo)
                 tk.Label(row, image=photo).pack(side=tk.LEFT, padx=5, pady=5)
-            except Exception:
+            else:
                 tk.Label(row, text="[error]", width=20).pack(side=tk.LEFT, padx=5, pady=5)
 
             info = tk.Frame(row)
@@ -0,0 +1,89 @@
+"""Export the CLIP image and text towers to ONNX for the onnx encoder backend.
+
+Usage:
+    python export_onnx.py                      # mobileclip-s0 -> onnx/mobileclip-s0/
+    python export_onnx.py --preset vit-b-32 --out-dir /tmp/vit-b-32
+
+Start the sidecar with CLIP_BACKEND=onnx to serve the exported towers.
+"""
+
+import argparse
+import os
+import sys
+
+import open_clip
+import torch
+
+from clip_encoder import MODEL_PRESETS, ONNX_DIR, create_model, model_input_size
+
+OPSET_VERSION = 17
+
+
+class ImageTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, image):
+        return self.model.encode_image(image)
+
+
+class TextTower(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, tokens):
+        return self.model.encode_text(tokens)
+
+
+def export(preset: str, out_dir: str):
+    # Built directly on CPU in fp32: the serving encoder casts to fp16 on
+    # CUDA, which would bake rounded weights into the exported graph
+    model, _ = create_model(preset)
+    model_name = MODEL_PRESETS[preset]["model"]
+    tokenizer = open_clip.get_tokenizer(model_name)
+    os.makedirs(out_dir, exist_ok=True)
+
+    visual_path = os.path.join(out_dir, "visual.onnx")
+    torch.onnx.export(
+        ImageTower(model),
+        torch.zeros(1, 3, *model_input_size(model_name)),
+        visual_path,
+        input_names=["image"],
+        output_names=["embedding"],
+        dynamic_axes={"image": {0: "batch"}, "embedding": {0: "batch"}},
+        opset_version=OPSET_VERSION,
+    )
+    print(f"Wrote {visual_path}")
+
+    text_path = os.path.join(out_dir, "text.onnx")
+    torch.onnx.export(
+        TextTower(model),
+        tokenizer(["a photo"]),
+        text_path,
+        input_names=["tokens"],
+        output_names=["embedding"],
+        dynamic_axes={"tokens": {0: "batch"}, "embedding": {0: "batch"}},
+        opset_version=OPSET_VERSION,
+    )
+    print(f"Wrote {text_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export CLIP towers to ONNX")
+    parser.add_argument("--preset", default="mobileclip-s0",
+                        help=f"Model preset ({', '.join(MODEL_PRESETS)})")
+    parser.add_argument("--out-dir", default=None,
+                        help="Output directory (default: onnx/<preset>)")
+    args = parser.parse_args()
+
+    if args.preset not in MODEL_PRESETS:
+        print(f"Error: unknown preset: {args.preset}", file=sys.stderr)
+        sys.exit(1)
+
+    export(args.preset, args.out_dir or os.path.join(ONNX_DIR, args.preset))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 """FastAPI ML sidecar for CLIP inference and search."""
 
+import base64
+import os
 from contextlib import asynccontextmanager
 
+import numpy as np
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 
 from clip_encoder import CLIPEncoder, MODEL_PRESETS
@@ -11,16 +15,24 @@ from searcher import Searcher
 encoder: CLIPEncoder | None = None
 searcher: Searcher | None = None
 
+# "torch" (default) or "onnx" (towers exported with export_onnx.py)
+CLIP_BACKEND = os.environ.get("CLIP_BACKEND", "torch")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global encoder, searcher
-    encoder = CLIPEncoder()
+    encoder = CLIPEncoder(backend=CLIP_BACKEND)
+    encoder.warmup()
     searcher = Searcher(encoder)
     yield
 
 
-app = FastAPI(title="intelsk ML sidecar", lifespan=lifespan)
+app = FastAPI(
+    title="intelsk ML sidecar",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 
 # --- Request models ---
@@ -57,7 +69,14 @@ def health():
 @app.post("/encode/image")
 def encode_image(req: EncodeImageRequest):
     embeddings = encoder.encode_images(req.paths)
-    return {"embeddings": [emb.tolist() for emb in embeddings]}
+    # Raw little-endian float16 rows, base64-encoded: the backend stores CLIP
+    # embeddings as float16, and this avoids N*D Python floats in JSON
+    data = np.ascontiguousarray(embeddings, dtype="<f2")
+    return {
+        "embeddings_b64": base64.b64encode(data.tobytes()).decode("ascii"),
+        "shape": list(data.shape),
+        "dtype": "float16",
+    }
 
 
 @app.post("/encode/text")
@@ -98,7 +117,11 @@ def reload_model(req: ReloadRequest):
     if req.preset not in MODEL_PRESETS:
         raise HTTPException(status_code=400, detail=f"unknown preset: {req.preset}")
 
-    encoder = CLIPEncoder(preset=req.preset)
+    # Build and warm the new encoder before swapping it in; requests keep
+    # using the old one meanwhile
+    new_encoder = CLIPEncoder(preset=req.preset, backend=CLIP_BACKEND)
+    new_encoder.warmup()
+    encoder = new_encoder
     searcher = Searcher(encoder)
 
     return {
@@ -1,17 +1,182 @@
 """Search CLIP embeddings in SQLite by text query."""
 
+import os
 import sqlite3
+import threading
+from collections import OrderedDict
 
 import numpy as np
 
 from clip_encoder import CLIPEncoder
 
+try:
+    import faiss
+except ImportError:  # optional: ranking falls back to a NumPy matmul
+    faiss = None
+
+# Databases whose index stays in memory, and filter selections kept per index
+MAX_CACHED_INDEXES = 8
+MAX_CACHED_SELECTIONS = 32
+
+# Rows fetched and decoded per step when loading a database
+LOAD_CHUNK_ROWS = 8192
+
+
+def decode_embeddings(blobs: list[bytes], dim: int) -> np.ndarray:
+    """Decode stored embedding blobs into one C-contiguous (N, dim) float32 matrix.
+
+    Blobs are float16 (current writer) or float32 (older rows). Each kind is
+    joined into a single buffer and decoded with one ``frombuffer`` call.
+    """
+    half = np.fromiter((len(b) == dim * 2 for b in blobs), dtype=bool, count=len(blobs))
+    if half.all():
+        return np.frombuffer(b"".join(blobs), dtype=np.float16).reshape(-1, dim).astype(np.float32)
+
+    matrix = np.empty((len(blobs), dim), dtype=np.float32)
+    for mask, dtype in ((half, np.float16), (~half, np.float32)):
+        if mask.any():
+            joined = b"".join(b for b, keep in zip(blobs, mask) if keep)
+            matrix[mask] = np.frombuffer(joined, dtype=dtype).reshape(-1, dim)
+    return matrix
+
+
+class ClipIndex:
+    """All CLIP embeddings of one database, loaded once and reused across queries.
+
+    With FAISS installed the embeddings live in an exact inner-product index
+    (cosine similarity, since embeddings are L2-normalized); otherwise the
+    matrix is kept for a NumPy matmul.
+    """
+
+    def __init__(self, version: tuple, rows: list[tuple], embeddings: np.ndarray):
+        """``rows`` are (id, camera_id, timestamp), aligned with the rows of
+        ``embeddings``. Display metadata stays in SQLite and is fetched for
+        the top results only."""
+        self.version = version
+        self.ids = [row[0] for row in rows]
+        self.camera_ids = np.array([row[1] for row in rows])
+        self.timestamps = np.array([row[2] for row in rows])
+        self._selections: OrderedDict[tuple, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+
+        if faiss is not None:
+            # Exact inner-product scan over vectors held as float16, like the blobs
+            self.index = faiss.IndexScalarQuantizer(
+                embeddings.shape[1], faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+            )
+            self.index.add(embeddings)
+            self.embeddings = None
+        else:
+            self.index = None
+            self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(
+        self,
+        text_emb: np.ndarray,
+        limit: int,
+        camera_ids: list[str] | None = None,
+        start_time: str | None = None,
+        end_time: str | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return (scores, row positions) of the best ``limit`` matching rows, best first."""
+        if limit <= 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        selection = self._selection(camera_ids, start_time, end_time)
+        if selection is None:
+            positions, params = None, None
+        else:
+            positions, params = selection
+            if len(positions) == 0:
+                return np.empty(0, dtype=np.float32), positions
+
+        if self.index is not None:
+            scores, found = self.index.search(
+                text_emb.reshape(1, -1), limit, params=params[0] if params else None
+            )
+            keep = found[0] >= 0
+            return scores[0][keep], found[0][keep]
+
+        # One GEMV over the persistent matrix; filters pick from the N scores
+        # instead of gathering an (n, D) submatrix per query
+        scores = self.embeddings.dot(text_emb.astype(np.float32, copy=False))
+        if positions is None:
+            positions = np.arange(len(self))
+        else:
+            scores = scores[positions]
+        # Partial selection of the top k, then sort only those k
+        k = min(limit, len(scores))
+        top = np.argpartition(scores, -k)[-k:]
+        ranked = top[np.argsort(scores[top])[::-1]]
+        return scores[ranked], positions[ranked]
+
+    def _selection(
+        self,
+        camera_ids: list[str] | None,
+        start_time: str | None,
+        end_time: str | None,
+    ) -> tuple | None:
+        """Rows matching the camera/time filters as (positions, FAISS search params).
+
+        Returns None when nothing is filtered. Dashboards repeat the same
+        filters, so recent selections are kept (LRU) with their FAISS selector.
+        """
+        key = (tuple(sorted(camera_ids or ())), start_time or None, end_time or None)
+        if key == ((), None, None):
+            return None
+
+        with self._lock:
+            selection = self._selections.get(key)
+            if selection is not None:
+                self._selections.move_to_end(key)
+                return selection
+
+        positions = self._filter_positions(camera_ids, start_time, end_time)
+        params = None
+        if self.index is not None and len(positions):
+            # The params hold a raw pointer, so the selector is kept in the cache too
+            selector = faiss.IDSelectorBatch(positions)
+            params = (faiss.SearchParameters(sel=selector), selector)
+        selection = (positions, params)
+
+        with self._lock:
+            self._selections[key] = selection
+            while len(self._selections) > MAX_CACHED_SELECTIONS:
+                self._selections.popitem(last=False)
+        return selection
+
+    def _filter_positions(
+        self,
+        camera_ids: list[str] | None,
+        start_time: str | None,
+        end_time: str | None,
+    ) -> np.ndarray:
+        """Row positions matching the camera/time filters."""
+        mask = np.ones(len(self), dtype=bool)
+        if camera_ids:
+            mask &= np.isin(self.camera_ids, camera_ids)
+        if start_time:
+            mask &= self.timestamps >= start_time
+        if end_time:
+            # If end_time is a date-only string (no "T"), append end-of-day
+            # so that timestamps like "2026-02-20T14:00:00" are included.
+            if "T" not in end_time:
+                end_time = end_time + "T23:59:59"
+            mask &= self.timestamps <= end_time
+        return np.flatnonzero(mask).astype(np.int64)
+
 
 class Searcher:
     """Ranks stored CLIP embeddings against a text query using cosine similarity."""
 
     def __init__(self, encoder: CLIPEncoder):
         self.encoder = encoder
+        self._indexes: OrderedDict[str, ClipIndex] = OrderedDict()
+        self._load_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
 
     def search_by_text(
         self,
@@ -26,77 +191,142 @@ class Searcher:
         """Encode text and rank stored CLIP embeddings by cosine similarity."""
         text_emb = self.encoder.encode_text(text)
 
-        conn = sqlite3.connect(db_path)
-        try:
-            rows = self._load_clip_embeddings(conn, camera_ids, start_time, end_time)
-        finally:
-            conn.close()
-
-        if not rows:
+        index = self._get_index(db_path)
+        if index is None:
             return []
 
-        # Build matrix of embeddings and compute similarities
-        ids, embeddings, metadata = [], [], []
-        for row in rows:
-            ids.append(row[0])
-            embeddings.append(np.frombuffer(row[1], dtype=np.float32))
-            metadata.append({
-                "camera_id": row[2],
-                "timestamp": row[3],
-                "frame_path": row[4],
-                "source_video": row[5],
-            })
-
-        emb_matrix = np.stack(embeddings)
-        # Cosine similarity = dot product (embeddings are L2-normalized)
-        scores = emb_matrix @ text_emb
+        scores, ranked = index.search(text_emb, limit, camera_ids, start_time, end_time)
 
-        # Rank by descending score, drop anything below the relevance threshold
-        ranked_indices = np.argsort(scores)[::-1][:limit]
+        # Results come best first; drop anything below the relevance threshold
+        keep = int(np.count_nonzero(scores >= min_score))
+        if keep == 0:
+            return []
+        scores, ranked = scores[:keep], ranked[:keep]
 
+        metadata = self._load_result_metadata(db_path, [index.ids[idx] for idx in ranked])
         results = []
-        for idx in ranked_indices:
-            if scores[idx] < min_score:
-                break
+        for score, idx in zip(scores, ranked):
+            frame_id = index.ids[idx]
+            if frame_id not in metadata:
+                continue  # deleted since the index was built
+            frame_path, source_video = metadata[frame_id]
             results.append({
-                "id": ids[idx],
-                "frame_path": metadata[idx]["frame_path"],
-                "camera_id": metadata[idx]["camera_id"],
-                "timestamp": metadata[idx]["timestamp"],
-                "source_video": metadata[idx]["source_video"],
-                "score": float(scores[idx]),
+                "id": frame_id,
+                "frame_path": frame_path,
+                "camera_id": str(index.camera_ids[idx]),
+                "timestamp": str(index.timestamps[idx]),
+                "source_video": source_video,
+                "score": float(score),
             })
         return results
 
+    def _get_index(self, db_path: str) -> ClipIndex | None:
+        """Return the cached index for ``db_path``, reloading it if the database changed.
+
+        Loading happens outside the cache lock, so reading one database never
+        blocks searches on others; a per-database lock keeps concurrent
+        requests from loading the same database twice.
+        """
+        version = self._db_version(db_path)
+        index = self._cached_index(db_path, version)
+        if index is not None:
+            return index
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(db_path, threading.Lock())
+        with load_lock:
+            # Another request may have loaded it while we waited
+            index = self._cached_index(db_path, version)
+            if index is not None:
+                return index
+
+            conn = sqlite3.connect(db_path)
+            try:
+                rows, embeddings = self._load_clip_embeddings(conn, self.encoder.embedding_dim)
+            finally:
+                conn.close()
+            index = ClipIndex(version, rows, embeddings) if rows else None
+
+            with self._lock:
+                if index is None:
+                    self._indexes.pop(db_path, None)
+                    return None
+                self._indexes[db_path] = index
+                self._indexes.move_to_end(db_path)
+                while len(self._indexes) > MAX_CACHED_INDEXES:
+                    self._indexes.popitem(last=False)
+            return index
+
+    def _cached_index(self, db_path: str, version: tuple) -> ClipIndex | None:
+        with self._lock:
+            index = self._indexes.get(db_path)
+            if index is not None and index.version == version:
+                self._indexes.move_to_end(db_path)
+                return index
+        return None
+
     @staticmethod
-    def _load_clip_embeddings(
-        conn: sqlite3.Connection,
-        camera_ids: list[str] | None = None,
-        start_time: str | None = None,
-        end_time: str | None = None,
-    ) -> list[tuple]:
-        """Load CLIP embeddings from SQLite with optional camera/time filtering."""
-        query = "SELECT id, embedding, camera_id, timestamp, frame_path, source_video FROM clip_embeddings"
-        conditions = []
-        params = []
+    def _db_version(db_path: str) -> tuple:
+        """Cheap change marker for a database: size and mtime of the file and its WAL.
 
-        if camera_ids:
-            placeholders = ",".join("?" for _ in camera_ids)
-            conditions.append(f"camera_id IN ({placeholders})")
-            params.extend(camera_ids)
-        if start_time:
-            conditions.append("timestamp >= ?")
-            params.append(start_time)
-        if end_time:
-            # If end_time is a date-only string (no "T"), append end-of-day
-            # so that timestamps like "2026-02-20T14:00:00" are included.
-            if "T" not in end_time:
-                end_time = end_time + "T23:59:59"
-            conditions.append("timestamp <= ?")
-            params.append(end_time)
+        The backend writes in WAL mode, so new rows land in the -wal file and
+        only reach the main file at checkpoints.
+        """
+        version = []
+        for path in (db_path, db_path + "-wal"):
+            try:
+                st = os.stat(path)
+                version.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                version.append(None)
+        return tuple(version)
+
+    @staticmethod
+    def _load_result_metadata(db_path: str, ids: list[str]) -> dict[str, tuple]:
+        """Fetch (frame_path, source_video) for the ranked ids by primary key."""
+        placeholders = ",".join("?" * len(ids))
+        conn = sqlite3.connect(db_path)
+        try:
+            cursor = conn.execute(
+                "SELECT id, frame_path, source_video FROM clip_embeddings "
+                f"WHERE id IN ({placeholders})",
+                ids,
+            )
+            return {row[0]: row[1:] for row in cursor}
+        finally:
+            conn.close()
 
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
+    @staticmethod
+    def _load_clip_embeddings(
+        conn: sqlite3.Connection, dim: int
+    ) -> tuple[list[tuple], np.ndarray]:
+        """Load all CLIP embeddings with their metadata from SQLite.
+
+        Rows are streamed in chunks and decoded straight into a preallocated
+        matrix, so the blobs are never all held as Python bytes at once.
+        Returns (id, camera_id, timestamp) tuples and the aligned (N, dim)
+        float32 matrix.
+        """
+        # Read-side tuning only; journal_mode belongs to the backend (writer)
+        conn.execute("PRAGMA mmap_size = 1073741824")
+        conn.execute("PRAGMA cache_size = -262144")
+        conn.execute("PRAGMA temp_store = MEMORY")
 
-        cursor = conn.execute(query, params)
-        return cursor.fetchall()
+        # One read transaction, so the count and the rows see the same snapshot
+        conn.execute("BEGIN")
+        try:
+            (count,) = conn.execute("SELECT COUNT(*) FROM clip_embeddings").fetchone()
+            matrix = np.empty((count, dim), dtype=np.float32)
+            rows = []
+            cursor = conn.execute(
+                "SELECT id, embedding, camera_id, timestamp FROM clip_embeddings"
+            )
+            while chunk := cursor.fetchmany(LOAD_CHUNK_ROWS):
+                start = len(rows)
+                matrix[start : start + len(chunk)] = decode_embeddings(
+                    [row[1] for row in chunk], dim
+                )
+                rows.extend((row[0],) + row[2:] for row in chunk)
+        finally:
+            conn.rollback()
+        return rows, matrix